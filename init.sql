@@ -8,5 +8,7 @@ CREATE TABLE IF NOT EXISTS registrations (
     areaOfResidence VARCHAR(255),
     emergencyContactName VARCHAR(255),
     relationship VARCHAR(100),
-    emergencyContactMobileNumber VARCHAR(20)
+    emergencyContactMobileNumber VARCHAR(20),
+    clicked INT DEFAULT 0,
+    INDEX idx_clicked_id (clicked, id)
 );
\ No newline at end of file
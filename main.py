@@ -1,54 +1,135 @@
 from fastapi import FastAPI, HTTPException, Query, Request, Depends, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from pydantic import BaseModel, EmailStr, constr, field_validator, Field
+from fastapi.security import HTTPBasic
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, EmailStr, constr, field_validator, model_validator, Field, PrivateAttr
 import mysql.connector
+import mysql.connector.pooling
+import asyncio
 import logging
+import multiprocessing
+import threading
 import os
-import base64
-import tempfile
+import pybase64
+import io
 import re
 from passporteye import read_mrz
-from datetime import datetime
+from passporteye.mrz.image import MRZPipeline
+from skimage import img_as_float
+import cv2
+import numpy as np
+from datetime import date
 from typing import List, Optional, Tuple
-from functools import wraps
+from functools import lru_cache, wraps
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from time import time
-from collections import defaultdict
+from collections import defaultdict, deque
 from fastapi import Request, HTTPException
 import secrets
 
-app = FastAPI()
-
 # Configure logging
+# Log to stdout only; synchronous file writes would block the event loop.
+# Set LOG_FILE to additionally write to a file (e.g. for local debugging).
+LOG_FILE = os.getenv("LOG_FILE")
+log_handlers = [logging.StreamHandler()]
+if LOG_FILE:
+    log_handlers.append(logging.FileHandler(LOG_FILE))
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("mrz_parser.log"),
-        logging.StreamHandler()
-    ]
+    handlers=log_handlers
 )
 logger = logging.getLogger(__name__)
 
+DATA_URI_PREFIX = "data:image/"
+# Allowed characters for free-text registration fields, compiled once at import
+NAME_CHARS_RE = re.compile(r"^[\w\s\-\.\']+$")
+
 # MySQL connection settings (use environment variables in production)
 MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "password")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "mrzdb")
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", 20))
+
+# mysql.connector is blocking; DB work runs on its own threads, one per
+# pooled connection, so a checkout never finds the pool exhausted.
+db_executor = ThreadPoolExecutor(max_workers=MYSQL_POOL_SIZE, thread_name_prefix="mysql")
+
+# uvicorn reads WEB_CONCURRENCY as its worker count; split the cores between
+# the web workers so each one's OCR pool doesn't oversubscribe the machine.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+
+# read_mrz is CPU-bound (OpenCV + Tesseract) and holds the GIL for much of
+# its image work, so it runs in worker processes, one image per process.
+# The semaphore keeps images from queueing up inside the executor.
+def new_ocr_executor():
+    return ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        # spawn, not fork: the parent already runs the DB threads
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+ocr_executor = new_ocr_executor()
+ocr_semaphore = asyncio.Semaphore(OCR_WORKERS)
+
+async def run_ocr(image_data: bytes):
+    """Run read_image_mrz on the OCR pool, replacing the pool if a worker died."""
+    global ocr_executor
+    executor = ocr_executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, read_image_mrz, image_data)
+    except BrokenProcessPool:
+        # A broken pool rejects all further work; only the first caller to
+        # notice swaps it, so concurrent failures don't start several pools
+        if ocr_executor is executor:
+            logger.error("OCR worker died; starting a new pool")
+            ocr_executor = new_ocr_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+# Longest image side handed to OCR; larger phone photos are scaled down first
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", 1600))
+
+def clean_base64(b64_string: str) -> Tuple[str, str]:
+    """Extract base64 data and extension from URI if present."""
+    logger.debug("Cleaning base64 string of length: %d", len(b64_string))
+    # Plain base64 (the usual API client case) is rejected without scanning
+    if b64_string.startswith(DATA_URI_PREFIX):
+        header, _, data = b64_string.partition(",")
+        ext, _, encoding = header[len(DATA_URI_PREFIX):].partition(";")
+        if data and encoding == "base64" and ext.isalnum():
+            logger.debug("Found image extension: %s", ext)
+            return data, ext
+    logger.debug("No URI prefix found, assuming plain base64")
+    return b64_string, "png"
 
 class ImageBase64Request(BaseModel):
     image_base64: constr(min_length=100, max_length=10_000_000, strip_whitespace=True)
+    # Decoded once while validating; the handler reuses them via image_bytes/image_ext
+    _image_bytes: bytes = PrivateAttr(default=b"")
+    _image_ext: str = PrivateAttr(default="png")
 
-    @field_validator("image_base64")
-    @classmethod
-    def validate_base64(cls, v):
-        b64_data = v
-        if b64_data.startswith("data:image/"):
-            b64_data = b64_data.split(",", 1)[-1]
+    @model_validator(mode="after")
+    def decode_base64(self):
+        b64_data, self._image_ext = clean_base64(self.image_base64)
         try:
-            base64.b64decode(b64_data, validate=True)
+            self._image_bytes = pybase64.b64decode(b64_data, validate=True)
         except Exception:
             raise ValueError("Invalid base64-encoded image data")
-        return v
+        return self
+
+    @property
+    def image_bytes(self) -> bytes:
+        return self._image_bytes
+
+    @property
+    def image_ext(self) -> str:
+        return self._image_ext
 
 class RegistrationRequest(BaseModel):
     fullName: constr(min_length=2, max_length=255, strip_whitespace=True)
@@ -62,8 +143,7 @@ class RegistrationRequest(BaseModel):
     @field_validator("fullName", "areaOfResidence", "emergencyContactName", "relationship")
     @classmethod
     def no_special_chars(cls, v):
-        import re
-        if not re.match(r"^[\w\s\-\.\']+$", v):
+        if not NAME_CHARS_RE.match(v):
             raise ValueError("Field contains invalid characters")
         return v
 
@@ -78,14 +158,23 @@ class RegistrationResponse(BaseModel):
     emergencyContactMobileNumber: str
 
 class PaginatedRegistrations(BaseModel):
-    total: int
+    total: Optional[int] = None
     skip: int
     limit: int
+    next_cursor: Optional[int] = None
     data: List[RegistrationResponse]
 
 class PaginationRequest(BaseModel):
     skip: int = 0
     limit: int = 10
+    cursor_id: Optional[int] = None
+
+    @field_validator("cursor_id")
+    @classmethod
+    def cursor_non_negative(cls, v):
+        if v is not None and v < 0:
+            raise ValueError("cursor_id must be non-negative")
+        return v
 
     @field_validator("skip")
     @classmethod
@@ -101,33 +190,166 @@ class PaginationRequest(BaseModel):
             raise ValueError("limit must be between 1 and 100")
         return v
 
-def get_db_connection():
-    return mysql.connector.connect(
+@lru_cache(maxsize=1)
+def get_db_pool():
+    return mysql.connector.pooling.MySQLConnectionPool(
+        pool_name="mrz",
+        pool_size=MYSQL_POOL_SIZE,
         host=MYSQL_HOST,
         user=MYSQL_USER,
         password=MYSQL_PASSWORD,
         database=MYSQL_DATABASE
     )
 
-def clean_base64(b64_string: str) -> Tuple[str, str]:
-    """Extract base64 data and extension from URI if present."""
-    logger.debug(f"Cleaning base64 string of length: {len(b64_string)}")
-    match = re.match(r"data:image/(?P<ext>\w+);base64,(?P<data>.+)", b64_string)
-    if match:
-        ext = match.group("ext")
-        data = match.group("data")
-        logger.debug(f"Found image extension: {ext}")
-        return data, ext
-    logger.debug("No URI prefix found, assuming plain base64")
-    return b64_string, "png"
+def get_db_connection():
+    """Check out a pooled connection; close() hands it back to the pool."""
+    return get_db_pool().get_connection()
+
+async def run_db(func, *args):
+    """Run a blocking database function on the MySQL thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, func, *args)
+
+CREATE_REGISTRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS registrations (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        fullName VARCHAR(255),
+        email VARCHAR(255),
+        mobileNumber VARCHAR(20),
+        areaOfResidence VARCHAR(255),
+        emergencyContactName VARCHAR(255),
+        relationship VARCHAR(100),
+        emergencyContactMobileNumber VARCHAR(20),
+        clicked INT DEFAULT 0,
+        INDEX idx_clicked_id (clicked, id)
+    )
+"""
+# Tables created before the clicked column existed get it added at startup.
+# MySQL 8.0 has no ADD COLUMN IF NOT EXISTS, so look it up first.
+CLICKED_COLUMN_EXISTS_SQL = """
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'registrations' AND COLUMN_NAME = 'clicked'
+"""
+ADD_CLICKED_COLUMN_SQL = "ALTER TABLE registrations ADD COLUMN clicked INT DEFAULT 0"
+# Serves both the offset and keyset page queries (WHERE clicked=0 ORDER BY id)
+CLICKED_INDEX_EXISTS_SQL = """
+    SELECT COUNT(*) FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'registrations' AND INDEX_NAME = 'idx_clicked_id'
+"""
+ADD_CLICKED_INDEX_SQL = "CREATE INDEX idx_clicked_id ON registrations (clicked, id)"
+
+# Statements used by the request handlers. These go over the text protocol:
+# pooled sessions are reset on checkin, which drops server-side prepared
+# statements, so preparing per request would only add a round trip.
+INSERT_REGISTRATION_SQL = """
+    INSERT INTO registrations (
+        fullName, email, mobileNumber, areaOfResidence,
+        emergencyContactName, relationship, emergencyContactMobileNumber
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+COUNT_REGISTRATIONS_SQL = "SELECT COUNT(*) as total FROM registrations"
+# Offset pages carry the table count as a column so both come back in one round trip
+SELECT_REGISTRATIONS_SQL = """
+    SELECT r.*, (SELECT COUNT(*) FROM registrations) AS total
+    FROM registrations r WHERE r.clicked=0 ORDER BY r.id ASC LIMIT %s OFFSET %s
+"""
+SELECT_REGISTRATIONS_AFTER_SQL = "SELECT * FROM registrations WHERE clicked=0 AND id > %s ORDER BY id ASC LIMIT %s"
+MARK_CLICKED_SQL = "UPDATE registrations SET clicked = 10 WHERE id = %s"
+
+def init_schema():
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_REGISTRATIONS_SQL)
+        cursor.execute(CLICKED_COLUMN_EXISTS_SQL)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(ADD_CLICKED_COLUMN_SQL)
+        cursor.execute(CLICKED_INDEX_EXISTS_SQL)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(ADD_CLICKED_INDEX_SQL)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ensure the schema exists once per process instead of on every request
+    try:
+        await run_db(init_schema)
+    except Exception as e:
+        logger.error("Schema initialisation failed: %s", e)
+    rate_sweeper = asyncio.create_task(sweep_rate_limits())
+    yield
+    rate_sweeper.cancel()
+    ocr_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# MRZ text and registration pages are JSON; compress anything non-trivial
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
+def load_mrz_image(image_data: bytes):
+    """Decode to the float grayscale passporteye works on, capped at MAX_IMAGE_SIDE.
+
+    Returns None if OpenCV cannot decode the data.
+    """
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    h, w = img.shape
+    if max(h, w) > MAX_IMAGE_SIDE:
+        scale = MAX_IMAGE_SIDE / max(h, w)
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        logger.debug("Downscaled image from %dx%d to %dx%d", w, h, img.shape[1], img.shape[0])
+    # Same value range as passporteye's Loader (skimage imread with as_gray)
+    return img_as_float(img)
+
+# MRZ attributes the /mrz/ response is built from. Only these are copied off
+# the passporteye object; to_dict() would also compute every validity flag.
+MRZ_ATTRIBUTES = (
+    "mrz_type", "type", "country", "number", "check_number", "nationality",
+    "date_of_birth", "sex", "expiration_date", "optional1", "optional2",
+    "surname", "names",
+)
+
+def read_image_mrz(image_data: bytes):
+    """OCR a decoded image in an ocr_executor worker; returns the MRZ fields or None."""
+    try:
+        img = load_mrz_image(image_data)
+        if img is None:
+            # Not something OpenCV can read; let passporteye's own loader try
+            mrz = read_mrz(io.BytesIO(image_data))
+        else:
+            # Seed the pipeline's "img" stage so its loader never decodes the file
+            pipeline = MRZPipeline(None)
+            pipeline["img"] = img
+            mrz = pipeline.result
+    except Exception as e:
+        # Library exceptions don't all unpickle in the parent (pytesseract's
+        # TesseractNotFoundError doesn't), and one that fails breaks the pool
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    if mrz is None:
+        return None
+    # Plain data, so the result pickles cleanly across processes. Attributes
+    # are missing for MRZ types that don't define them (e.g. optional2 on TD3).
+    data = {attr: getattr(mrz, attr, None) for attr in MRZ_ATTRIBUTES}
+    data["raw_text"] = mrz.aux.get("raw_text")
+    return data
+
+@lru_cache(maxsize=2048)
 def format_date(raw_date: str) -> str:
     """Convert MRZ date format (YYMMDD) to ISO format (YYYY-MM-DD)."""
     try:
         if raw_date:
-            return datetime.strptime(raw_date, "%y%m%d").strftime("%Y-%m-%d")
-    except Exception as e:
-        logger.warning(f"Failed to parse date '{raw_date}': {str(e)}")
+            # The format is fixed, so slice instead of going through strptime
+            if len(raw_date) != 6 or not raw_date.isdigit():
+                raise ValueError("expected six digits")
+            yy = int(raw_date[:2])
+            # Same century pivot as strptime's %y: 69-99 -> 19xx, 00-68 -> 20xx
+            year = 1900 + yy if yy >= 69 else 2000 + yy
+            return date(year, int(raw_date[2:4]), int(raw_date[4:6])).isoformat()
+    except ValueError as e:
+        logger.warning("Failed to parse date '%s': %s", raw_date, e)
     return None
 
 def parse_kenyan_names(raw_name: str) -> Tuple[str, str]:
@@ -135,30 +357,20 @@ def parse_kenyan_names(raw_name: str) -> Tuple[str, str]:
     Parse Kenyan names from MRZ data with comprehensive cleaning.
     Handles cases where full name is in surname field with L placeholders.
     """
-    logger.info(f"Starting name parsing for: '{raw_name}'")
+    logger.debug("Starting name parsing for: '%s'", raw_name)
     
     if not raw_name:
         logger.warning("Empty name input received")
         return "", ""
     
-    # First clean: normalize whitespace and remove obvious placeholders
-    cleaned = ' '.join(raw_name.split())
-    cleaned = re.sub(r'\bL\b', '', cleaned)  # Remove standalone L's
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-    logger.debug(f"After initial cleaning: '{cleaned}'")
-    
-    # Second clean: remove any remaining L patterns
-    cleaned = re.sub(r'L+$', '', cleaned).strip()  # Trailing L's
-    cleaned = re.sub(r'^L+', '', cleaned).strip()  # Leading L's
-    logger.debug(f"After L removal: '{cleaned}'")
-    
-    if not cleaned:
-        logger.warning("All content removed during cleaning")
-        return "", ""
-    
-    # Split into components
-    parts = [p for p in cleaned.split() if p and p != 'L']
-    logger.debug(f"Name parts after splitting: {parts}")
+    # Single pass: split on whitespace/filler and drop standalone L placeholders
+    parts = [p for p in raw_name.replace('<', ' ').split() if p != 'L']
+    if parts:
+        # OCR'd filler can also stick to the ends as runs of L's
+        parts[-1] = parts[-1].rstrip('L')
+        parts[0] = parts[0].lstrip('L')
+        parts = [p for p in parts if p]
+    logger.debug("Name parts after splitting: %s", parts)
     
     if not parts:
         logger.warning("No valid name parts found after splitting")
@@ -166,26 +378,58 @@ def parse_kenyan_names(raw_name: str) -> Tuple[str, str]:
     
     # Kenyan naming convention: last non-L part is surname
     surname = parts[-1]
-    given_names = " ".join(parts[:-1]) if len(parts) > 1 else ""
+    given_names = " ".join(parts[:-1])
     
-    logger.info(f"Parsed names - Given: '{given_names}', Surname: '{surname}'")
-    return given_names.strip(), surname.strip()
+    logger.debug("Parsed names - Given: '%s', Surname: '%s'", given_names, surname)
+    return given_names, surname
 
-security = HTTPBasic()
 BASIC_AUTH_USERNAME = os.getenv("BASIC_AUTH_USERNAME", "g86EGP0CMY")
 BASIC_AUTH_PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "gz2MR9vZfq4xXWPouHxqRsL5ckbymCjM")
+# Encoded once; compare_digest on str also rejects non-ASCII input with a TypeError
+BASIC_AUTH_USERNAME_BYTES = BASIC_AUTH_USERNAME.encode("utf-8")
+BASIC_AUTH_PASSWORD_BYTES = BASIC_AUTH_PASSWORD.encode("utf-8")
 
-def verify_basic_auth(credentials: HTTPBasicCredentials = Depends(security)):
-    correct_username = secrets.compare_digest(credentials.username, BASIC_AUTH_USERNAME)
-    correct_password = secrets.compare_digest(credentials.password, BASIC_AUTH_PASSWORD)
-    if not (correct_username and correct_password):
-        logger.warning(f"Failed login attempt for user: {credentials.username}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    return credentials.username
+@lru_cache(maxsize=256)
+def check_basic_authorization(authorization: str) -> Tuple[Optional[str], bool]:
+    """
+    Decode a Basic Authorization header and check its credentials.
+    Returns (username, valid); username is None if the header is malformed.
+    Memoized per header value: a client fleet sends the same few headers,
+    and the expected credentials are fixed for the life of the process.
+    """
+    scheme, _, param = authorization.partition(" ")
+    if scheme.lower() != "basic" or not param:
+        return None, False
+    try:
+        decoded = pybase64.b64decode(param, validate=True).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return None, False
+    username, sep, password = decoded.partition(":")
+    if not sep:
+        return None, False
+    correct_username = secrets.compare_digest(username.encode("utf-8"), BASIC_AUTH_USERNAME_BYTES)
+    correct_password = secrets.compare_digest(password.encode("utf-8"), BASIC_AUTH_PASSWORD_BYTES)
+    return username, correct_username and correct_password
+
+class CachedHTTPBasic(HTTPBasic):
+    """HTTPBasic (same OpenAPI scheme) that checks the raw header via check_basic_authorization."""
+
+    async def __call__(self, request: Request) -> str:
+        username, valid = check_basic_authorization(request.headers.get("Authorization", ""))
+        if not valid:
+            if username is not None:
+                logger.warning("Failed login attempt for user: %s", username)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        return username
+
+security = CachedHTTPBasic(scheme_name="HTTPBasic")
+
+def verify_basic_auth(username: str = Depends(security)):
+    return username
 
 @app.post("/mrz/")
 async def extract_mrz(
@@ -195,50 +439,28 @@ async def extract_mrz(
 ):
     """Endpoint for extracting MRZ data from ID images."""
     try:
-        # Step 1: Decode base64 and save temporary image
-        b64_data = body.image_base64  # <-- FIXED
-        logger.info(f"Received base64 data of length: {len(b64_data)}")
-        
-        # Clean and validate base64 data
-        image_data, ext = clean_base64(b64_data)
-        logger.info(f"Cleaned base64 data, extracted extension: {ext}")
-        
-        try:
-            image_data = base64.b64decode(image_data)
-        except Exception as e:
-            logger.error(f"Base64 decoding failed: {str(e)}")
-            return {"status": "FAILURE", "error": "Invalid base64 data"}
+        # Step 1: The image was base64-decoded once during request validation
+        image_data = body.image_bytes
+        logger.info("Received %s image of %d bytes", body.image_ext, len(image_data))
 
         # Step 2: Extract MRZ
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as tmp:
-            tmp.write(image_data)
-            tmp_path = tmp.name
-        logger.info(f"Saved temporary image to: {tmp_path}")
-        
         try:
             logger.debug("Starting MRZ extraction")
-            mrz = read_mrz(tmp_path)
+            async with ocr_semaphore:
+                data = await run_ocr(image_data)
             
-            if mrz is None:
+            if data is None:
                 logger.error("No MRZ data found in image")
                 return {"status": "FAILURE", "error": "No MRZ found"}
             
-            data = mrz.to_dict()
-            logger.debug(f"Raw MRZ data: {data}")
+            logger.debug("Raw MRZ data: %s", data)
         except Exception as e:
-            logger.error(f"MRZ extraction failed: {str(e)}", exc_info=True)
+            logger.error("MRZ extraction failed: %s", e, exc_info=True)
             return {"status": "FAILURE", "error": "MRZ extraction error"}
-        finally:
-            try:
-                os.unlink(tmp_path)
-                logger.debug("Temporary file removed")
-            except:
-                pass
 
         # Step 3: Parse names
-        raw_name = data.get("surname", "") or data.get("names", "")
-        logger.info(f"Raw name field from MRZ: '{raw_name}'")
-        logger.info(f"Raw data :'{data}'")
+        raw_name = data["surname"] or data["names"] or ""
+        logger.debug("Raw name field from MRZ: '%s'", raw_name)
         
         given_name, surname = parse_kenyan_names(raw_name)
         
@@ -257,49 +479,27 @@ async def extract_mrz(
             "expiry_date": format_date(data.get("expiration_date")),
             "optional_data": (data.get("optional1") or "") + (data.get("optional2") or ""),
             "mrz_text": data.get("raw_text"),
-            "status": "SUCCESS",
-            "debug": {
+            "status": "SUCCESS"
+        }
+        # isEnabledFor honours inherited levels; logger.level is 0 unless set directly
+        if logger.isEnabledFor(logging.DEBUG):
+            response["debug"] = {
                 "raw_surname_field": raw_name,
                 "name_components": raw_name.split() if raw_name else []
-            } if logger.level == logging.DEBUG else None
-        }
+            }
         
         logger.info("MRZ extraction completed successfully")
         return response
 
     except Exception as e:
-        logger.critical(f"Unexpected error in MRZ extraction: {str(e)}", exc_info=True)
+        logger.critical("Unexpected error in MRZ extraction: %s", e, exc_info=True)
         return {"status": "FAILURE", "error": "Internal server error"}
 
-@app.post("/register/")
-async def register_user(
-    request: Request,
-    data: RegistrationRequest,
-    username: str = Depends(verify_basic_auth)
-):
+def insert_registration(data: RegistrationRequest):
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
-        # Ensure table exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS registrations (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                fullName VARCHAR(255),
-                email VARCHAR(255),
-                mobileNumber VARCHAR(20),
-                areaOfResidence VARCHAR(255),
-                emergencyContactName VARCHAR(255),
-                relationship VARCHAR(100),
-                emergencyContactMobileNumber VARCHAR(20)
-            )
-        """)
-        # Insert data
-        cursor.execute("""
-            INSERT INTO registrations (
-                fullName, email, mobileNumber, areaOfResidence,
-                emergencyContactName, relationship, emergencyContactMobileNumber
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
+        cursor.execute(INSERT_REGISTRATION_SQL, (
             data.fullName,
             data.email,
             data.mobileNumber,
@@ -310,13 +510,50 @@ async def register_user(
         ))
         conn.commit()
         cursor.close()
+    finally:
         conn.close()
-        logger.info(f"Registered user: {data.fullName}")
+
+@app.post("/register/")
+async def register_user(
+    request: Request,
+    data: RegistrationRequest,
+    username: str = Depends(verify_basic_auth)
+):
+    try:
+        await run_db(insert_registration, data)
+        logger.info("Registered user: %s", data.fullName)
         return {"message": "Registration successful"}
     except Exception as e:
-        logger.error(f"Registration failed: {e}")
+        logger.error("Registration failed: %s", e)
         raise HTTPException(status_code=500, detail="Registration failed")
 
+def fetch_registrations(skip: int, limit: int, cursor_id: Optional[int] = None):
+    conn = get_db_connection()
+    try:
+        # Plain tuples; column names are resolved once per query, not per row
+        cursor = conn.cursor()
+        total = None
+        if cursor_id is not None:
+            # Keyset page: seeks straight to the cursor, no COUNT and no skipped rows
+            cursor.execute(SELECT_REGISTRATIONS_AFTER_SQL, (cursor_id, limit))
+            cols = [c[0] for c in cursor.description]
+            rows = cursor.fetchall()
+        else:
+            cursor.execute(SELECT_REGISTRATIONS_SQL, (limit, skip))
+            # The trailing column is the table count; keep it out of the rows
+            cols = [c[0] for c in cursor.description][:-1]
+            rows = cursor.fetchall()
+            if rows:
+                total = rows[0][-1]
+            else:
+                # Past the last page there is no row to carry the count
+                cursor.execute(COUNT_REGISTRATIONS_SQL)
+                total = cursor.fetchone()[0]
+        cursor.close()
+        return total, [dict(zip(cols, row)) for row in rows]
+    finally:
+        conn.close()
+
 @app.post(
     "/registrations/",
     response_model=PaginatedRegistrations,
@@ -327,6 +564,9 @@ Returns a paginated list of registrations using a JSON body.
 **Request Body:**
 - `skip`: Number of records to skip (default: 0)
 - `limit`: Maximum number of records to return (default: 10, max: 100)
+- `cursor_id`: Return records with an id greater than this, ignoring `skip`.
+  Pass the previous response's `next_cursor` to page without OFFSET scans;
+  `total` is omitted in this mode.
 """
 )
 async def list_registrations_post(
@@ -337,24 +577,16 @@ async def list_registrations_post(
     try:
         skip = body.skip
         limit = min(body.limit, 100)
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT COUNT(*) as total FROM registrations")
-        total = cursor.fetchone()["total"]
-        cursor.execute(
-            "SELECT * FROM registrations WHERE clicked=0 ORDER BY id ASC LIMIT %s OFFSET %s", (limit, skip)
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        total, rows = await run_db(fetch_registrations, skip, limit, body.cursor_id)
         return {
             "total": total,
             "skip": skip,
             "limit": limit,
+            "next_cursor": rows[-1]["id"] if len(rows) == limit else None,
             "data": rows
         }
     except Exception as e:
-        logger.error(f"Error fetching registrations: {e}")
+        logger.error("Error fetching registrations: %s", e)
         raise HTTPException(status_code=500, detail="Could not fetch registrations")
 
 from pydantic import BaseModel, Field
@@ -362,61 +594,103 @@ from pydantic import BaseModel, Field
 class UpdateClickedRequest(BaseModel):
     id: int = Field(..., gt=0, description="ID of the registration to update")
 
+def mark_clicked(registration_id: int) -> int:
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Update the clicked column for the given id
+        cursor.execute(MARK_CLICKED_SQL, (registration_id,))
+        conn.commit()
+        affected = cursor.rowcount
+        cursor.close()
+        return affected
+    finally:
+        conn.close()
+
 @app.post("/registrations/update_clicked/")
 async def update_clicked_column(
     request: Request,
     body: UpdateClickedRequest,
     username: str = Depends(verify_basic_auth)
 ):
-    rate_limiter(request)
     ip = request.client.host
-    logger.info(f"Update 'clicked' column request from IP: {ip}, user: {username}, id: {body.id}")
+    logger.info("Update 'clicked' column request from IP: %s, user: %s, id: %s", ip, username, body.id)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Ensure the 'clicked' column exists
-        cursor.execute("""
-            ALTER TABLE registrations
-            ADD COLUMN IF NOT EXISTS clicked INT DEFAULT 0
-        """)
-        # Update the clicked column for the given id
-        cursor.execute(
-            "UPDATE registrations SET clicked = 10 WHERE id = %s", (body.id,)
-        )
-        conn.commit()
-        affected = cursor.rowcount
-        cursor.close()
-        conn.close()
+        affected = await run_db(mark_clicked, body.id)
         if affected == 0:
-            logger.warning(f"No registration found with id {body.id}")
+            logger.warning("No registration found with id %s", body.id)
             return {"status": "error", "message": f"No registration found with id {body.id}"}
-        logger.info(f"Updated 'clicked' column for id {body.id}")
+        logger.info("Updated 'clicked' column for id %s", body.id)
         return {"status": "success", "message": f"Clicked column updated for id {body.id}"}
     except Exception as e:
-        logger.error(f"Error updating clicked column: {e}")
+        logger.error("Error updating clicked column: %s", e)
         raise HTTPException(status_code=500, detail="Failed to update clicked column")
 
 # Rate limiting setup (simple in-memory, per-IP)
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", 30))  # requests
 RATE_PERIOD = int(os.getenv("RATE_PERIOD", 60))  # seconds
 
-ip_request_times = defaultdict(list)
+RATE_SWEEP_INTERVAL = 300  # seconds between sweeps of idle IPs
+
+# Timestamps per IP, oldest first; never more than RATE_LIMIT are needed
+ip_request_times = defaultdict(lambda: deque(maxlen=RATE_LIMIT))
+# Guards ip_request_times against callers on other threads
+rate_lock = threading.Lock()
 
 def rate_limiter(request: Request):
-    ip = request.client.host
+    ip = request.client.host if request.client else "unknown"
     now = time()
     window_start = now - RATE_PERIOD
-    # Remove timestamps outside the window
-    ip_request_times[ip] = [t for t in ip_request_times[ip] if t > window_start]
-    if len(ip_request_times[ip]) >= RATE_LIMIT:
-        logger.warning(f"Rate limit exceeded for IP: {ip}")
-        raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded: {RATE_LIMIT} requests per {RATE_PERIOD} seconds"
-        )
-    ip_request_times[ip].append(now)
-    logger.info(f"Request from IP: {ip} - {len(ip_request_times[ip])} requests in window")
+    with rate_lock:
+        timestamps = ip_request_times[ip]
+        # Remove timestamps outside the window
+        while timestamps and timestamps[0] <= window_start:
+            timestamps.popleft()
+        if len(timestamps) >= RATE_LIMIT:
+            logger.warning("Rate limit exceeded for IP: %s", ip)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded: {RATE_LIMIT} requests per {RATE_PERIOD} seconds"
+            )
+        timestamps.append(now)
+        count = len(timestamps)
+    logger.info("Request from IP: %s - %d requests in window", ip, count)
+
+def prune_rate_limits():
+    """Forget IPs with no requests left in the current window."""
+    window_start = time() - RATE_PERIOD
+    with rate_lock:
+        idle = [ip for ip, timestamps in ip_request_times.items()
+                if not timestamps or timestamps[-1] <= window_start]
+        for ip in idle:
+            del ip_request_times[ip]
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    # Count every request, not just the endpoints that remember to call in.
+    # Exceptions raised in middleware bypass FastAPI's handlers, so answer here.
+    try:
+        rate_limiter(request)
+    except HTTPException as e:
+        return ORJSONResponse(status_code=e.status_code, content={"detail": e.detail})
+    return await call_next(request)
+
+async def sweep_rate_limits():
+    while True:
+        await asyncio.sleep(RATE_SWEEP_INTERVAL)
+        prune_rate_limits()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Exported so each spawned worker sizes its OCR pool from the same count
+    workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=1000,
+        timeout_keep_alive=30
+    )
\ No newline at end of file